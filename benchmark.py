@@ -0,0 +1,200 @@
+import argparse
+import csv
+import importlib.util
+import math
+import sys
+import time
+from . import blockBuilder
+
+# Scaling benchmark of the block detection on synthetic blockings:
+#   python -m swiftBlock.benchmark --sizes 2 4 8 -o results.csv
+# Every phase of blockFinder is timed for every engine, blocking and size and written as
+# one csv row: case, size, engine, search, verts, edges, blocks, phase, count, seconds.
+
+def lattice(nx, ny, nz, ox=0.):
+    # nx*ny*nz cartesian blocks
+    idx = lambda i,j,k: i + (nx+1)*(j + (ny+1)*k)
+    verts = [(i+ox, j, k) for k in range(nz+1) for j in range(ny+1) for i in range(nx+1)]
+    edges = []
+    for k in range(nz+1):
+        for j in range(ny+1):
+            for i in range(nx+1):
+                if i < nx: edges.append([idx(i,j,k), idx(i+1,j,k)])
+                if j < ny: edges.append([idx(i,j,k), idx(i,j+1,k)])
+                if k < nz: edges.append([idx(i,j,k), idx(i,j,k+1)])
+    return edges, verts
+
+def extrude(edges2d, verts2d, nz):
+    # Stacks nz layers of a planar blocking
+    n = len(verts2d)
+    verts = [(x, y, float(k)) for k in range(nz+1) for x, y in verts2d]
+    edges = [[a + k*n, b + k*n] for k in range(nz+1) for a, b in edges2d]
+    edges += [[v + k*n, v + (k+1)*n] for k in range(nz) for v in range(n)]
+    return edges, verts
+
+def ogrid(m, nr, nz, rout=2.):
+    # Pipe: m*m centre blocks in a square surrounded by nr layers of 4*m blocks towards the wall
+    a = 0.5*rout/math.sqrt(2)
+    verts = [(a*(2.*i/m - 1), a*(2.*j/m - 1)) for j in range(m+1) for i in range(m+1)]
+    edges = []
+    for j in range(m+1):
+        for i in range(m+1):
+            if i < m: edges.append([i + j*(m+1), i+1 + j*(m+1)])
+            if j < m: edges.append([i + j*(m+1), i + (j+1)*(m+1)])
+    # the boundary of the square counterclockwise
+    loop = [i for i in range(m)] + [m + j*(m+1) for j in range(m)] \
+         + [m - i + m*(m+1) for i in range(m)] + [(m-j)*(m+1) for j in range(m)]
+    inner = loop
+    for l in range(1, nr+1):
+        f = float(l)/nr
+        layer = []
+        for v in loop:
+            x, y = verts[v]
+            r = math.hypot(x, y)
+            s = (1-f) + f*rout/r
+            layer.append(len(verts))
+            verts.append((s*x, s*y))
+        for i in range(len(loop)):
+            edges.append([layer[i], layer[(i+1) % len(loop)]])
+            edges.append([inner[i], layer[i]])
+        inner = layer
+    return extrude(edges, verts, nz)
+
+def cgrid(na, nw, nr, nz, chord=1., wake=2., rout=1.5):
+    # C-grid around an airfoil: nw blocks along the lower wake, na around the airfoil and nw
+    # along the upper wake, with nr layers of blocks between the wall and the far field
+    def inner(t):
+        if t < nw:
+            return chord + wake*(1 - float(t)/nw), 0.
+        if t > nw + na:
+            return chord + wake*(float(t - nw - na)/nw), 0.
+        phi = 2*math.pi*float(t - nw)/na
+        return 0.5*chord*(1 + math.cos(phi)), -0.06*chord*math.sin(phi)*(1 + math.cos(phi))
+    def outer(t):
+        if t < nw:
+            return chord + wake*(1 - float(t)/nw), -rout
+        if t > nw + na:
+            return chord + wake*(float(t - nw - na)/nw), rout
+        phi = math.pi*float(t - nw)/na
+        return 0.5*chord - rout*math.sin(phi), -rout*math.cos(phi)
+    ni = na + 2*nw
+    verts = []
+    for j in range(nr+1):
+        f = float(j)/nr
+        for i in range(ni+1):
+            (xi, yi), (xo, yo) = inner(i), outer(i)
+            verts.append(((1-f)*xi + f*xo, (1-f)*yi + f*yo))
+    edges = []
+    for j in range(nr+1):
+        for i in range(ni+1):
+            if i < ni: edges.append([i + j*(ni+1), i+1 + j*(ni+1)])
+            if j < nr: edges.append([i + j*(ni+1), i + (j+1)*(ni+1)])
+    # the upper and lower wake share their vertices up to the trailing edge
+    merged = dict((ni - i, i) for i in range(nw+1))
+    ids = dict()
+    for v in range(len(verts)):
+        if not v in merged:
+            ids[v] = len(ids)
+    ids.update((v, ids[w]) for v, w in merged.items())
+    seen = set()
+    unique = []
+    for a, b in edges:
+        e = (min(ids[a], ids[b]), max(ids[a], ids[b]))
+        if not e in seen:
+            seen.add(e)
+            unique.append([ids[a], ids[b]])
+    edges = unique
+    verts = [v for i, v in enumerate(verts) if not i in merged]
+    return extrude(edges, verts, nz)
+
+def assembly(n, size):
+    # n disconnected size*size*size lattices side by side
+    edges, verts = [], []
+    for c in range(n):
+        e, v = lattice(size, size, size, ox = c*(size + 1.))
+        edges += [[a + len(verts), b + len(verts)] for a, b in e]
+        verts += v
+    return edges, verts
+
+cases = {
+    'lattice': lambda n: lattice(n, n, n),
+    'ogrid': lambda n: ogrid(n, n, n),
+    'cgrid': lambda n: cgrid(4*n, n, n, n),
+    'assembly': lambda n: assembly(n, 3),
+}
+
+def engines():
+    # name: (numba argument of blockFinder, per component detection)
+    found = {'python': (False, False), 'components': (False, True)}
+    if importlib.util.find_spec('numba'):
+        found['numba'] = (True, False)
+        found['numbaParallel'] = ('parallel', False)
+    return found
+
+def timePhases(edges, verts, numba, search):
+    # seconds spent in each phase of blockFinderSteps
+    rows = []
+    start = last = time.perf_counter()
+    for phase, result in blockBuilder.blockFinderSteps(edges, verts, numba = numba, search = search):
+        now = time.perf_counter()
+        if phase == 'done':
+            nblocks = len(result)
+        else:
+            rows.append((phase, result, now - last))
+        last = now
+    rows.append(('total', nblocks, last - start))
+    return nblocks, rows
+
+def timeComponents(edges, verts, numba, search):
+    # parallelBlockFinder has no phases, only its total time
+    start = time.perf_counter()
+    result = blockBuilder.parallelBlockFinder(edges, verts, numba = numba, search = search)
+    nblocks = len(result)
+    return nblocks, [('total', nblocks, time.perf_counter() - start)]
+
+def run(caseNames, sizes, engineNames, searches, repeat=1, writer=None):
+    available = engines()
+    # one untimed run of every engine on a small blocking with two parts, so neither the Numba
+    # compilation nor the start of the fork server of the components engine is timed
+    edges, verts = assembly(2, 1)
+    for engine in engineNames:
+        numba, perComponent = available[engine]
+        for search in searches:
+            (timeComponents if perComponent else timePhases)(edges, verts, numba, search)
+    for name in caseNames:
+        for size in sizes:
+            edges, verts = cases[name](size)
+            for engine in engineNames:
+                numba, perComponent = available[engine]
+                for search in searches:
+                    best = None
+                    for r in range(repeat):
+                        nblocks, rows = (timeComponents if perComponent else timePhases)(edges, verts, numba, search)
+                        if best is None or rows[-1][2] < best[-1][2]:
+                            best = rows
+                    for phase, count, seconds in best:
+                        row = [name, size, engine, search, len(verts), len(edges), nblocks, phase, count, '{:.6f}'.format(seconds)]
+                        if writer:
+                            writer.writerow(row)
+                    print('{} {} {} {}: {} blocks in {:.3f} s'.format(name, size, engine, search, nblocks, best[-1][2]), file=sys.stderr)
+
+def main(argv=None):
+    available = engines()
+    parser = argparse.ArgumentParser(description='Time the phases of the block detection on synthetic blockings')
+    parser.add_argument('--cases', nargs='+', default=sorted(cases), choices=sorted(cases))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[2, 4, 6])
+    parser.add_argument('--engines', nargs='+', default=sorted(available), choices=sorted(available))
+    parser.add_argument('--search', nargs='+', default=['faceLoops', 'hexes'], choices=['faceLoops', 'hexes'])
+    parser.add_argument('--repeat', type=int, default=1, help='best of this many runs')
+    parser.add_argument('-o', '--output', help='csv file (default: standard output)')
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = csv.writer(out)
+    writer.writerow(['case', 'size', 'engine', 'search', 'verts', 'edges', 'blocks', 'phase', 'count', 'seconds'])
+    run(args.cases, args.sizes, args.engines, args.search, args.repeat, writer)
+    if args.output:
+        out.close()
+
+if __name__ == '__main__':
+    main()
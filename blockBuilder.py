@@ -1,39 +1,124 @@
-import mathutils
 import time
 import importlib
 import numpy as np
+from . import profiler
 # from . import cycleFinderNumba
 # importlib.reload(cycleFinderNumba)
 
-def removedup(seq):
-    checked = []
-    for e in seq:
-        if e not in checked:
-            checked.append(e)
-    return checked
-
-def edge(e0, e1):
-    return [min(e0,e1), max(e0,e1)]
-
-def couple_edges(dependent_edges):
-    for es0, edgeSet0 in enumerate(dependent_edges):
-        for edge in edgeSet0:
-            for es1, edgeSet1 in enumerate(dependent_edges):
-                if edge in edgeSet1 and es0 != es1:
-                    for e in edgeSet0:
-                        edgeSet1.append(e)
-                    dependent_edges.pop(es0)
-                    return True
-    return False
-
-
-
-def findFace(faces, vl):
+# Edges are identified by a packed int64 key, min<<32 | max, so sets of edges are sorted key
+# arrays searched with searchsorted instead of lists of vertex pairs searched with 'in'.
+def edgeKey(v0, v1):
+    v0, v1 = np.asarray(v0, dtype=np.int64), np.asarray(v1, dtype=np.int64)
+    return np.minimum(v0, v1) << 32 | np.maximum(v0, v1)
+
+def directedEdgeKey(v0, v1):
+    # v0<<32 | v1, for data that depends on the direction of the edge
+    return np.asarray(v0, dtype=np.int64) << 32 | np.asarray(v1, dtype=np.int64)
+
+def keyEdges(keys):
+    # The two vertices of packed edge keys
+    keys = np.asarray(keys, dtype=np.int64)
+    return keys >> 32, keys & 0xffffffff
+
+def edgeKeys(edges):
+    # Sorted keys of the edges and the edge id of each key
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    keys = edgeKey(edges[:,0], edges[:,1])
+    order = np.argsort(keys, kind='stable')
+    return keys[order], order
+
+def edgeLookup(edge_keys, v0, v1):
+    # Edge ids of the edges v0-v1, the last one if there are several and -1 where there is none
+    keys, ids = edge_keys
+    if not len(keys):
+        return np.full(np.shape(v0), -1, dtype=np.int64)
+    k = edgeKey(v0, v1)
+    pos = np.minimum(np.searchsorted(keys, k, side='right') - 1, len(keys) - 1)
+    return np.where(keys[pos] == k, ids[pos], -1)
+
+def disjointSetRoots(sets, n):
+    # Union-find with path compression: joins the items of every row in sets and
+    # returns the root of each item 0..n-1
+    parent = list(range(n))
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+    for s in sets.tolist():
+        r0 = find(s[0])
+        for i in s[1:]:
+            r = find(i)
+            if r != r0:
+                parent[r] = r0
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+def couple_edges(dependent_edges, roots=disjointSetRoots):
+    # Merge the sets of parallel edges sharing an edge into edge groups, each returned as a
+    # (k,2) array of unique edges. Groups and the edges within them are ordered by first
+    # appearance in dependent_edges, so the group ids are deterministic.
+    if not len(dependent_edges):
+        return []
+    es = np.asarray(dependent_edges, dtype=np.int64).reshape(len(dependent_edges), -1, 2)
+    keys, first, inverse = np.unique(edgeKey(es[:,:,0], es[:,:,1]).reshape(-1), return_index=True, return_inverse=True)
+    root = roots(inverse.reshape(len(es), -1), len(keys))
+    order = np.argsort(first, kind='stable')
+    groups, gfirst, gid = np.unique(root[order], return_index=True, return_inverse=True)
+    gid = np.argsort(np.argsort(gfirst))[gid.reshape(-1)]
+    members = order[np.argsort(gid, kind='stable')]
+    return np.split(np.stack(keyEdges(keys), axis=1)[members], np.cumsum(np.bincount(gid))[:-1])
+
+def faceIndex(faces):
+    # Hash index from the sorted vertex tuple of a quad face to its (first) face id
+    index = dict()
     for fid, f in enumerate(faces):
-        if vl[0] in f and vl[1] in f and vl[2] in f and vl[3] in f:
-            return fid, f
-    return -1, []
-
+        index.setdefault(tuple(sorted(f)), fid)
+    return index
+
+def vertexAdjacency(edges, nverts):
+    # Compressed sparse row (CSR) vertex to edge adjacency, built in one pass over the edge array.
+    # The edges of vertex v are edge_ids[offsets[v]:offsets[v+1]] (in increasing edge id order)
+    # and the vertices at their other ends are neighbours[offsets[v]:offsets[v+1]].
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    eids = np.arange(len(edges), dtype=np.int64)
+    ends = np.concatenate((edges[:,0], edges[:,1]))
+    others = np.concatenate((edges[:,1], edges[:,0]))
+    order = np.lexsort((np.concatenate((eids, eids)), ends))
+    offsets = np.zeros(nverts + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=nverts)[:nverts], out=offsets[1:])
+    return offsets, others[order], np.concatenate((eids, eids))[order]
+
+def edgeFaceIndex(faces_as_list_of_edges, nedges):
+    # Inverted CSR index from edge id to the quad faces using it. The faces of edge e are
+    # face_ids[offsets[e]:offsets[e+1]] in increasing order, slots holds the position of e in each face.
+    fe = np.asarray(faces_as_list_of_edges, dtype=np.int64).reshape(-1, 4)
+    flat = fe.ravel()
+    fids = np.repeat(np.arange(len(fe), dtype=np.int64), 4)
+    order = np.lexsort((fids, flat))
+    offsets = np.zeros(nedges + 1, dtype=np.int64)
+    np.cumsum(np.bincount(flat, minlength=nedges)[:nedges], out=offsets[1:])
+    return offsets, fids[order], order % 4
+
+def faceConnections(faces_as_list_of_edges, nedges):
+    # Pairs [min,max] of faces sharing an edge, emitted per edge from edgeFaceIndex. The pairs
+    # keep the order of the old all-faces scan (lower face, its edge slot, upper face) so the
+    # cycle search over them visits face loops in the same order.
+    offsets, face_ids, slots = edgeFaceIndex(faces_as_list_of_edges, nedges)
+    counts = np.diff(offsets)
+    pairs = [np.zeros((0,3), dtype=np.int64)]
+    for k in np.unique(counts[counts > 1]):
+        first = offsets[:-1][counts == k]
+        i, j = np.triu_indices(k, 1)
+        lower = (first[:,None] + i).ravel()
+        upper = (first[:,None] + j).ravel()
+        pairs.append(np.stack((face_ids[lower], slots[lower], face_ids[upper]), axis=1))
+    pairs = np.concatenate(pairs)
+    pairs = pairs[np.lexsort((pairs[:,2], pairs[:,1], pairs[:,0]))]
+    nfaces = len(faces_as_list_of_edges)
+    u = np.sort(np.unique(pairs[:,0]*nfaces + pairs[:,2], return_index=True)[1])
+    return pairs[u][:,[0,2]]
 
 def cycleFinder(edges,verts):
 # Credit: Adam Gaither. An Efficient Block Detection Algorithm For Structured Grid Generation
@@ -43,12 +128,8 @@ def cycleFinder(edges,verts):
     facesEdges = []
     no_edges = 0
 
-    v_in_edge = [[] for i in range(len(verts))]
-    for v in verts:
-        for eid, e in enumerate(edges):
-            if v in e:
-                v_in_edge[v].append(eid)
-    v_in_edges = np.array(v_in_edge)
+    offsets, neighbours, edge_ids = vertexAdjacency(edges, len(verts))
+    v_in_edge = [edge_ids[offsets[v]:offsets[v+1]].tolist() for v in range(len(verts))]
 
     for v in verticesId:
         currentCycle = [v]
@@ -58,14 +139,210 @@ def cycleFinder(edges,verts):
     faces = np.reshape(faces,(-1,4))
     temp, u = np.unique(np.sort(faces), axis=0, return_index=True)
     faces = faces[u]
-    facesP = [list(map(np.asscalar,f)) for f in faces]
+    facesP = faces.tolist()
 
     facesEdges = np.reshape(facesEdges,(-1,4))
     facesEdges = facesEdges[u]
-    facesEdgesP = [list(map(np.asscalar,f)) for f in facesEdges]
+    facesEdgesP = facesEdges.tolist()
 
     return facesP, facesEdgesP
 
+def degreeRanks(offsets):
+    # Vertices ranked by degree, ties by id, from the offsets of vertexAdjacency
+    degree = np.diff(offsets)
+    rank = np.empty(len(degree), dtype=np.int64)
+    rank[np.lexsort((np.arange(len(degree)), degree))] = np.arange(len(degree))
+    return rank
+
+def quadFinder(edges,verts,arrays=False):
+# Finds every 4-cycle once from wedges (a,b,c) instead of a depth first search. Vertices are ranked by
+# degree and a cycle is only built at its highest ranked vertex a, from two wedges a-b-c and a-d-c
+# through lower ranked vertices, which keeps the work close to sum(deg^2) also at O-grid hubs.
+# Returns the same faces, in the same order and orientation, as cycleFinder, as (F,4) arrays if arrays is set.
+    nverts = len(verts)
+    offsets, neighbours, edge_ids = vertexAdjacency(edges, nverts)
+    degree = np.diff(offsets)
+    rank = degreeRanks(offsets)
+    owner = np.repeat(np.arange(nverts, dtype=np.int64), degree)
+
+    # Wedges a-b-c with rank(b), rank(c) < rank(a)
+    keep = rank[neighbours] < rank[owner]
+    wa, wb, wab = owner[keep], neighbours[keep], edge_ids[keep]
+    n = degree[wb]
+    pos = np.repeat(offsets[wb] - np.cumsum(n) + n, n) + np.arange(n.sum())
+    wa, wb, wab = np.repeat(wa, n), np.repeat(wb, n), np.repeat(wab, n)
+    wc, wbc = neighbours[pos], edge_ids[pos]
+    keep = (rank[wc] < rank[wa])
+    wa, wb, wc, wab, wbc = wa[keep], wb[keep], wc[keep], wab[keep], wbc[keep]
+
+    # Every pair of wedges with the same ends (a,c) closes a cycle a-b-c-d
+    order = np.argsort(wa*nverts + wc, kind='stable')
+    pair_key = (wa*nverts + wc)[order]
+    starts = np.flatnonzero(np.r_[True, pair_key[1:] != pair_key[:-1]])
+    counts = np.diff(np.r_[starts, len(pair_key)])
+    cycles = [np.zeros((0,8), dtype=np.int64)]
+    for k in np.unique(counts[counts > 1]):
+        first = starts[counts == k]
+        i, j = np.triu_indices(k, 1)
+        w1 = order[(first[:,None] + i).ravel()]
+        w2 = order[(first[:,None] + j).ravel()]
+        cycles.append(np.stack((wa[w1], wb[w1], wc[w1], wb[w2], wab[w1], wbc[w1], wbc[w2], wab[w2]), axis=1))
+    return canonicalQuads(np.concatenate(cycles), arrays)
+
+def canonicalQuads(cycles, arrays=False):
+# The faces of the (n,8) cycles a,b,c,d, edges ab,bc,cd,da found from wedges, oriented and ordered like cycleFinder
+    quads, quadEdges = cycles[:,:4], cycles[:,4:]
+
+    # Start from the smallest vertex and walk towards the neighbour behind the smaller edge id,
+    # which is the cycle the depth first search meets first
+    rows = np.arange(len(quads))
+    p = np.argmin(quads, axis=1)
+    forward = quadEdges[rows, p] < quadEdges[rows, (p - 1) % 4]
+    walk = p[:,None] + np.where(forward, 1, -1)[:,None] * np.arange(4)
+    quads = quads[rows[:,None], walk % 4]
+    quadEdges = quadEdges[rows[:,None], np.where(forward[:,None], walk, walk - 1) % 4]
+
+    # One cycle per vertex set (the first one met), ordered like np.unique of the sorted vertices
+    sortedQuads = np.sort(quads)
+    u = np.lexsort(tuple(quadEdges[:,::-1].T) + tuple(sortedQuads[:,::-1].T))
+    dup = np.zeros(len(u), dtype=bool)
+    dup[1:] = np.all(sortedQuads[u][1:] == sortedQuads[u][:-1], axis=1)
+    u = u[~dup]
+    if arrays:
+        return quads[u], quadEdges[u]
+    return quads[u].tolist(), quadEdges[u].tolist()
+
+def hexFinder(faces_as_list_of_nodes, edges, nverts, face_index):
+# Finds potential blocks straight from the quad faces: for every face, the disjoint faces through the
+# neighbours of its first vertex that are joined to it by four edges, with the four side faces checked
+# in face_index. Returns [face0, face2] pairs, i.e. the lowest face id of each block and its opposite
+# face, in the order the face loop search (which starts every loop from its lowest face) gives them.
+    faces = np.asarray(faces_as_list_of_nodes, dtype=np.int64).reshape(-1, 4)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    edge_keys = edgeKeys(edges)
+
+    # Candidate pairs: face f, a neighbour of f[0] outside f and a face g through that neighbour
+    v_offsets, neighbours, edge_ids = vertexAdjacency(edges, nverts)
+    f_offsets, vertex_faces, slots = edgeFaceIndex(faces, nverts) # same index over the face vertices
+    first = faces[:,0]
+    n = np.diff(v_offsets)[first]
+    f = np.repeat(np.arange(len(faces)), n)
+    above = neighbours[np.repeat(v_offsets[first] - np.cumsum(n) + n, n) + np.arange(n.sum())]
+    keep = np.all(faces[f] != above[:,None], axis=1)
+    f, above = f[keep], above[keep]
+    n = np.diff(f_offsets)[above]
+    pos = np.repeat(f_offsets[above] - np.cumsum(n) + n, n) + np.arange(n.sum())
+    f, g, start = np.repeat(f, n), vertex_faces[pos], slots[pos]
+    keep = (f < g) & np.all(faces[f][:,:,None] != faces[g][:,None,:], axis=(1,2))
+    f, g, start = f[keep], g[keep], start[keep]
+
+    # Four connecting edges in either walking direction of g
+    rows = np.arange(len(g))[:,None]
+    quads = []
+    for step in (1, -1):
+        quad2 = faces[g][rows, (start[:,None] + step*np.arange(4)) % 4]
+        joined = np.all(edgeLookup(edge_keys, faces[f], quad2) >= 0, axis=1)
+        quads.append(np.concatenate((faces[f][joined], quad2[joined], np.stack((f[joined], g[joined]), axis=1)), axis=1))
+    quads = np.concatenate(quads).tolist()
+
+    blocks = dict()
+    for q in quads:
+        q1, q2, pair = q[0:4], q[4:8], q[8:10]
+        sides = [face_index.get(tuple(sorted((q1[i], q1[(i+1)%4], q2[(i+1)%4], q2[i]))), -1) for i in range(4)]
+        if -1 in sides:
+            continue
+        nodes = tuple(sorted(q1 + q2))
+        if nodes in blocks:
+            continue
+        opposite = dict()
+        for a, b in (pair, sides[0:4:2], sides[1:4:2]):
+            opposite[a], opposite[b] = b, a
+        face0 = min(opposite)
+        loops = [sorted(fid for fid in opposite if not fid in (a, opposite[a])) for a in opposite if not a in (face0, opposite[face0])]
+        blocks[nodes] = (min(loops), face0, opposite[face0])
+    return [[face0, face2] for loop, face0, face2 in sorted(blocks.values())]
+
+# The six faces of a block as vertex positions in the block
+blockFaceNodes = np.array([[0,1,2,3], [4,5,6,7], [0,1,5,4], [1,2,6,5], [2,3,7,6], [3,0,4,7]])
+
+def faceGeometry(face_coords):
+    # Newell normals (unit length, zero for degenerate faces) and centres of an (F,4,3) array of quads
+    face_coords = np.asarray(face_coords, dtype=float).reshape(-1,4,3)
+    nxt = np.roll(face_coords, -1, axis=1)
+    diff, summ = face_coords - nxt, face_coords + nxt
+    normals = np.stack((np.sum(diff[:,:,1]*summ[:,:,2], axis=1),
+                        np.sum(diff[:,:,2]*summ[:,:,0], axis=1),
+                        np.sum(diff[:,:,0]*summ[:,:,1], axis=1)), axis=1)
+    length = np.linalg.norm(normals, axis=1)
+    normals[length > 0] /= length[length > 0,None]
+    return normals, face_coords.mean(axis=1)
+
+def blockGeometry(coords, quad1, quad2):
+    # Orients (B,4) arrays of opposite quads, quad2[:,0] being above quad1[:,0]: quad2 is turned to
+    # rotate in the same direction as quad1 and the two are swapped to make the block righthanded.
+    # Returns the oriented quads, whether each block is flat and the block centres.
+    q1verts, q2verts = coords[quad1], coords[quad2]
+    normal1, facecentre1 = faceGeometry(q1verts)
+    normal2, facecentre2 = faceGeometry(q2verts)
+    blockcentre = 0.5*(facecentre1 + facecentre2)
+    v04 = q2verts[:,0] - q1verts[:,0]
+    scalarProd1 = np.einsum('ij,ij->i', blockcentre - facecentre1, normal1)
+    scalarProd2 = np.einsum('ij,ij->i', blockcentre - facecentre2, normal2)
+    scalarProd3 = np.einsum('ij,ij->i', normal1, v04)
+
+    turn = (scalarProd1*scalarProd2 > 0.)[:,None]
+    quad2 = np.where(turn, quad2[:,[0,3,2,1]], quad2)
+    swap = (scalarProd3 < 0.)[:,None]
+    quad1, quad2 = np.where(swap, quad2, quad1), np.where(swap, quad1, quad2)
+
+    scale = np.linalg.norm(v04, axis=1) * np.linalg.norm(normal1, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        flat = ~(np.abs(scalarProd3/scale) >= 0.01) # abs(sin(alpha)) < 0.01, where alpha is angle for normal1 and v04
+    return quad1, quad2, flat, blockcentre
+
+def faceSides(normals, facecentres, blockcentres):
+    # True where the block centre is on the positive side of the face
+    return np.sum(normals*(blockcentres - facecentres), axis=-1) >= 0.
+
+# The i, j and k edges of a block as vertex positions in the block
+blockEdgeNodes = np.array([[[0,1], [2,3], [4,5], [6,7]], [[1,2], [3,0], [5,6], [7,4]], [[0,4], [1,5], [2,6], [3,7]]])
+
+def faceLoopBlocks(faceLoops, faces):
+    # [face0, face2] pairs of the face loops forming a block: face 0 and face 2 share no vertex and the
+    # four faces have 8 vertices. Each block is identified several times, only its first loop is kept.
+    loops = np.asarray(faceLoops, dtype=np.int64).reshape(-1,4)
+    disjoint = ~np.any(faces[loops[:,0]][:,:,None] == faces[loops[:,2]][:,None,:], axis=(1,2))
+    loops = loops[disjoint]
+    nodes = np.sort(faces[loops].reshape(-1,16), axis=1)
+    new = np.ones(nodes.shape, dtype=bool)
+    new[:,1:] = nodes[:,1:] != nodes[:,:-1]
+    eight = np.count_nonzero(new, axis=1) == 8
+    loops, nodes = loops[eight], nodes[eight][new[eight]].reshape(-1,8)
+    first = np.sort(np.unique(nodes, axis=0, return_index=True)[1])
+    return loops[first][:,[0,2]]
+
+def blockOffences(fids, positive, nfaces):
+    # For each block the number of its faces having another block on the same side
+    sides = 2*fids + ~positive
+    count = np.bincount(sides.reshape(-1), minlength=2*nfaces)
+    return np.count_nonzero(count[sides] > 1, axis=1)
+
+def faceBlocks(fids, positive, nfaces):
+    # The first block on the positive and on the negative side of each face, -1 for none.
+    # fids and positive hold the faces of the blocks (K x 6) and on which side the block is.
+    bids = np.broadcast_to(np.arange(len(fids))[:,None], fids.shape)
+    sides = []
+    for side in (positive, ~positive):
+        first = np.full(nfaces, len(fids), dtype=np.int64)
+        np.minimum.at(first, fids[side], bids[side])
+        first[first == len(fids)] = -1
+        sides.append(first)
+    return sides
+
+def blockEdges(blocks):
+    # The sets of four parallel edges of the blocks, each set having the same resolution
+    return np.sort(blocks[:,blockEdgeNodes], axis=-1).reshape(-1,4,2)
+
 def buildFourEdgeFaces(v, v_in_edge, edgeVisited, edges, no_edges, currentCycle, currentCycleEdges, faces, facesEdges):
     for eid in v_in_edge[v]:
         if not edgeVisited[eid]:
@@ -91,27 +368,93 @@ def buildFourEdgeFaces(v, v_in_edge, edgeVisited, edges, no_edges, currentCycle,
             edgeVisited[eid] = False
 
 
-def blockFinder(edges, vertices_coord, logFileName='', debugFileName='', disabled = [], numba=False):
+class DetectionCancelled(Exception):
+    pass
+
+def checkCancel(cancel, deadline):
+    if cancel is not None and cancel.is_set():
+        raise DetectionCancelled('Block detection cancelled')
+    if deadline is not None and time.time() > deadline:
+        raise DetectionCancelled('Block detection ran out of its time budget')
+
+class BlockTopology:
+# Result of the block detection as arrays. block_verts are the vertices of the blocks (B x 8) and face_verts
+# those of the quad faces found (F x 4). face_owner and face_neighbour are the blocks on the positive and on
+# the negative side of each face, -1 if there is none, the first one if there are several. The edges of edge
+# group i are group_edges[group_offsets[i]:group_offsets[i+1]].
+    __slots__ = ('block_verts', 'face_verts', 'face_owner', 'face_neighbour', 'group_offsets', 'group_edges')
+
+    def __init__(self, block_verts, face_verts, face_owner, face_neighbour, group_offsets, group_edges):
+        self.block_verts = np.asarray(block_verts, dtype=np.int64).reshape(-1,8)
+        self.face_verts = np.asarray(face_verts, dtype=np.int64).reshape(-1,4)
+        self.face_owner = np.asarray(face_owner, dtype=np.int64)
+        self.face_neighbour = np.asarray(face_neighbour, dtype=np.int64)
+        self.group_offsets = np.asarray(group_offsets, dtype=np.int64)
+        self.group_edges = np.asarray(group_edges, dtype=np.int64).reshape(-1,2)
+
+    @classmethod
+    def fromGroups(cls, block_verts, face_verts, face_owner, face_neighbour, groups):
+        sizes = [len(np.reshape(g, (-1,2))) for g in groups]
+        group_edges = np.concatenate([np.reshape(g, (-1,2)) for g in groups]) if len(groups) else np.zeros((0,2))
+        return cls(block_verts, face_verts, face_owner, face_neighbour, np.concatenate(([0], np.cumsum(sizes, dtype=np.int64))), group_edges)
+
+    def __len__(self):
+        return len(self.block_verts)
+
+    @property
+    def ngroups(self):
+        return len(self.group_offsets) - 1
+
+    def group(self, i):
+        return self.group_edges[self.group_offsets[i]:self.group_offsets[i+1]]
+
+    def groups(self):
+        return np.split(self.group_edges, self.group_offsets[1:-1])
+
+    def groupIds(self):
+        # edge group of every row of group_edges
+        return np.repeat(np.arange(self.ngroups), np.diff(self.group_offsets))
+
+    def blockFaces(self):
+        # ids of the faces with a block on at least one side
+        return np.flatnonzero((self.face_owner >= 0) | (self.face_neighbour >= 0))
+
+    def nbytes(self):
+        return sum(getattr(self, a).nbytes for a in self.__slots__)
+
+def blockFinder(edges, vertices_coord, logFileName='', debugFileName='', disabled = [], numba=False, search='faceLoops'):
+    for phase, result in blockFinderSteps(edges, vertices_coord, logFileName, debugFileName, disabled, numba, search):
+        pass
+    return result
+
+def blockFinderSteps(edges, vertices_coord, logFileName='', debugFileName='', disabled = [], numba=False, search='faceLoops', cancel=None, budget=None):
+# blockFinder as a generator yielding (phase, count) after each phase and ('done', results) at the end.
+# cancel is a threading.Event or anything else with is_set(), and budget a time limit in seconds; both
+# are checked between the phases and raise DetectionCancelled.
+    deadline = time.time() + budget if budget else None
     if len(logFileName) > 0:
         logFile = open(logFileName,'w')
     else:
         logFile = ''
 
     # Use the cycle finder class to find all edges forming quad faces
-    if numba:
-        from . import cycleFinderNumba
-        tmp_v,tmp_e = cycleFinderNumba.cycleFinder(edges,range(len(vertices_coord)))
-    else:
-        tmp_v,tmp_e = cycleFinder(edges,range(len(vertices_coord)))
+    with profiler.span('cycle finding'):
+        if numba:
+            from . import cycleFinderNumba
+            tmp_v,tmp_e = cycleFinderNumba.cycleFinder(edges,range(len(vertices_coord)),parallel = numba == 'parallel')
+        else:
+            tmp_v,tmp_e = quadFinder(edges,range(len(vertices_coord)))
 
-    faces_as_list_of_vertices = []
     faces_as_list_of_nodes = []
     faces_as_list_of_edges = []
     for ii, i in enumerate(tmp_v): # get rid of possible triangles
         if len(i) == 4:
-            faces_as_list_of_vertices.append([vertices_coord[i[0]], vertices_coord[i[1]], vertices_coord[i[2]], vertices_coord[i[3]]])
             faces_as_list_of_nodes.append(i)
             faces_as_list_of_edges.append(tmp_e[ii])
+    face_index = faceIndex(faces_as_list_of_nodes)
+    profiler.count('faces', len(faces_as_list_of_nodes))
+    yield 'faces', len(faces_as_list_of_nodes)
+    checkCancel(cancel, deadline)
     # Create a wavefront obj file showing all the faces just found
     if len(debugFileName) > 0:
         debugFile = open(debugFileName,'w')
@@ -124,213 +467,303 @@ def blockFinder(edges, vertices_coord, logFileName='', debugFileName='', disable
             debugFile.write('\n')
         debugFile.close()
 
-    # Store some info for the faces in a dict
-    face_info = {}
-    for fid, f in enumerate(faces_as_list_of_vertices):
-        normal = mathutils.geometry.normal(f[0],f[1],f[2],f[3])
-        facecentre = mathutils.Vector((0,0,0))
-        for v in f:
-            facecentre += 0.25*v
-        face_info[fid] = {}
-        face_info[fid]['normal'] = normal
-        face_info[fid]['pos'] = []
-        face_info[fid]['neg'] = []
-        face_info[fid]['centre'] = facecentre
-
-    connections_between_faces = []
-    # Find connections between faces, i.e. they share one edge
-    for fid1, f1 in enumerate(faces_as_list_of_edges):
-        for e in f1:
-            for fid2, f2 in enumerate(faces_as_list_of_edges):
-                if e in f2 and not fid1 == fid2:
-                    if not [min(fid1,fid2),max(fid1,fid2)] in connections_between_faces:
-                        connections_between_faces.append([min(fid1,fid2),max(fid1,fid2)])
-
-    #this is the most time consuming step
-    # Use these connections to find cycles of connected faces; called faceLoops
-    if numba:
-        faceLoops_as_list_of_faces, faceLoops_as_list_of_connections = cycleFinderNumba.cycleFinder(connections_between_faces,range(len(faces_as_list_of_vertices)))
+    coords = np.array([tuple(v) for v in vertices_coord], dtype=float).reshape(-1,3)
+    faces = np.asarray(faces_as_list_of_nodes, dtype=np.int64).reshape(-1,4)
+    face_normals, face_centres = faceGeometry(coords[faces])
+
+    if search == 'hexes':
+        # Look for the opposite face of every face directly
+        with profiler.span('hex search'):
+            potentialBlocks = hexFinder(faces_as_list_of_nodes, edges, len(vertices_coord), face_index)
     else:
-        faceLoops_as_list_of_faces, faceLoops_as_list_of_connections = cycleFinder(connections_between_faces,range(len(faces_as_list_of_vertices)))
-    # faceLoops_as_list_of_faces, faceLoops_as_list_of_connections = blockBuilder2.cycleFinder(connections_between_faces,range(len(faces_as_list_of_vertices)))
-
-
-    # Dig out block structures from these face loops
-    block_as_faceLoop = []
-    for qf in faceLoops_as_list_of_faces:
-        qf_is_a_block = True
-        for n in faces_as_list_of_nodes[qf[0]]:
-            if n in faces_as_list_of_nodes[qf[2]]: #if any of the vertices in face 0 is in face 2, this is not a block
-                qf_is_a_block = False
-        if qf_is_a_block:
-            block_as_faceLoop.append(qf)
-    # Get rid of block dublets - there are plenty
-    faceLoops_nodes = [[] for i in range(len(block_as_faceLoop))]
-    for qfid, qf in enumerate(block_as_faceLoop):
-        for f in qf:
-            for n in faces_as_list_of_nodes[f]:
-                if not n in faceLoops_nodes[qfid]:
-                    faceLoops_nodes[qfid].append(n)
-    for qf in faceLoops_nodes:
-        qf.sort()
-    tmp = []
-    potentialBlocks = [] # Each block is identified several times. Condense and put in potentialBlocks (list of vertices index)
-    for qfid, qf in enumerate(faceLoops_nodes):
-        if not qf in tmp:
-            tmp.append(qf)
-            if len(qf) == 8:
-                potentialBlocks.append(block_as_faceLoop[qfid])
-    offences = []
-    block_centres = []
-    formalBlocks = []
-    dependent_edges = []
-    all_edges = []
+        # Find connections between faces, i.e. they share one edge
+        with profiler.span('face connections'):
+            connections_between_faces = faceConnections(faces_as_list_of_edges, len(edges))
+        profiler.count('face connections', len(connections_between_faces))
+        yield 'face connections', len(connections_between_faces)
+        checkCancel(cancel, deadline)
+
+        #this is the most time consuming step
+        # Use these connections to find cycles of connected faces; called faceLoops
+        with profiler.span('face loops'):
+            if numba:
+                faceLoops_as_list_of_faces, faceLoops_as_list_of_connections = cycleFinderNumba.cycleFinder(connections_between_faces,range(len(faces)),parallel = numba == 'parallel',arrays=True)
+            else:
+                faceLoops_as_list_of_faces, faceLoops_as_list_of_connections = quadFinder(connections_between_faces,range(len(faces)),arrays=True)
+        profiler.count('face loops', len(faceLoops_as_list_of_faces))
+        yield 'face loops', len(faceLoops_as_list_of_faces)
+        checkCancel(cancel, deadline)
+        # Dig out block structures from these face loops
+        with profiler.span('face loop blocks'):
+            potentialBlocks = faceLoopBlocks(faceLoops_as_list_of_faces, faces)
     if len(logFileName) > 0:
         logFile.write('number of potential blocks identified = ' + str(len(potentialBlocks)) + '\n')
+    profiler.count('potential blocks', len(potentialBlocks))
+    yield 'potential blocks', len(potentialBlocks)
+    checkCancel(cancel, deadline)
+
+    with profiler.span('classification'):
+        pairs = np.asarray(potentialBlocks, dtype=np.int64).reshape(-1,2)
+        quad1, opposite = faces[pairs[:,0]], faces[pairs[:,1]]
+        edge_keys = edgeKeys(edges)
+        # Locate the vertex just above quad1[0], the last one in the edge list if there are several
+        above = edgeLookup(edge_keys, np.repeat(quad1[:,:1], 4, axis=1), opposite)
+        complete = np.any(above >= 0, axis=1)
+        q2start = np.argmax(above, axis=1)
+        quad2 = opposite[np.arange(len(pairs))[:,None], (q2start[:,None] + np.arange(4)) % 4]
+        quad1, quad2, flat, block_centres = blockGeometry(coords, quad1, quad2)
+        joined = np.all(edgeLookup(edge_keys, quad1, quad2) >= 0, axis=1)
 
-    for b in potentialBlocks:
-        is_a_real_block = True  # more sanity checks soon...
-        block = []
-        for n in faces_as_list_of_nodes[b[0]]:
-            block.append(n)
-        for n in faces_as_list_of_nodes[b[2]]:
-            block.append(n)
-        q2start = None
-        for e in edges: # Locate the vertex just above block[0]. Store as q2start
-            if block[0] == e[0]:
-                if e[1] in block[4:8]:
-                    q2start = block.index(e[1])
-            if block[0] == e[1]:
-                if e[0] in block[4:8]:
-                    q2start = block.index(e[0])
-        if q2start == None: # if not found above - this is not a complete block.
-            q1nodes = block[0:4]
-            q2nodes = block[4:-1]
-            if len(logFileName) > 0:
-                logFile.write('one block found was incomplete! ' + str(q1nodes) + str(q2nodes) + '\n')
-            continue
-            q2start = 0 #just set it to something. block wont be printed anyway
-        quad1 = block[0:4]
-        quad2 = []
-        for i in range(4):
-            quad2.append(block[(i + q2start) % 4 + 4])
-        q1verts = [vertices_coord[quad1[0]],vertices_coord[quad1[1]],vertices_coord[quad1[2]],vertices_coord[quad1[3]]]
-        q2verts = [vertices_coord[quad2[0]],vertices_coord[quad2[1]],vertices_coord[quad2[2]],vertices_coord[quad2[3]]]
-
-        blockcentre = mathutils.Vector((0,0,0))
-        for n in block:
-            blockcentre += 0.125*vertices_coord[n]
-        q1fid, tmp = findFace(faces_as_list_of_nodes, quad1)
-        q2fid, tmp = findFace(faces_as_list_of_nodes, quad2)
-
-        normal1 = mathutils.geometry.normal(*q1verts)
-        normal2 = mathutils.geometry.normal(*q2verts)
-
-        facecentre1 = face_info[q1fid]['centre']
-        facecentre2 = face_info[q2fid]['centre']
-        direction1 = blockcentre-facecentre1
-        direction2 = blockcentre-facecentre2
-
-        v04 = q2verts[0] - q1verts[0]
-        scalarProd1 = direction1.dot(normal1)
-        scalarProd2 = direction2.dot(normal2)
-        scalarProd3 = normal1.dot(v04)
-
-        if scalarProd1*scalarProd2 > 0.: # make quad1 and quad2 rotate in the same direction
-            quad2 = [quad2[0], quad2[-1], quad2[-2], quad2[-3]]
-            normal2 *= -1.0
-
-        if scalarProd3 < 0.: # Maintain righthanded system in each block
-            tmp = list(quad2)
-            quad2 = list(quad1)
-            quad1 = tmp
-
-        for nid,n in enumerate(quad1): #check that all edges are present
-            if not (([n,quad2[nid]] in edges) or ([quad2[nid],n] in edges)):
-                if len(logFileName) > 0:
-                    logFile.write('one block did not have all edges! ' + str(quad1) + str(quad2) + '\n')
-                is_a_real_block = False
-                break
-        if not is_a_real_block:
-            continue
-   # more sanity...
-        scale = v04.magnitude * normal1.magnitude
-        if (abs(scalarProd3/scale) < 0.01): # abs(sin(alpha)) < 0.01, where alpha is angle for normal1 and v04
-            if len(logFileName) > 0:
-                logFile.write('flat block ruled out!' + str(quad1) + str(quad2) + '\n')
-            continue
-
-        if is_a_real_block: # this write-out only works if blenders own vertex numbering starts at zero!! seems to work...
-            offences.append(0)
-            block_centres.append(blockcentre)
-
-            vl = quad1 + quad2
-            formalBlocks.append(vl) # list of verts defining the block in correct order
+    if len(logFileName) > 0:
+        for bid in range(len(pairs)):
+            if not complete[bid]: # this is not a complete block.
+                block = faces[pairs[bid]].reshape(-1).tolist()
+                logFile.write('one block found was incomplete! ' + str(block[0:4]) + str(block[4:-1]) + '\n')
+            elif not joined[bid]: # check that all edges are present
+                logFile.write('one block did not have all edges! ' + str(quad1[bid].tolist()) + str(quad2[bid].tolist()) + '\n')
+            elif flat[bid]:
+                logFile.write('flat block ruled out!' + str(quad1[bid].tolist()) + str(quad2[bid].tolist()) + '\n')
+    kept = complete & joined & ~flat
+    profiler.count('rejected incomplete', int(np.sum(~complete)))
+    profiler.count('rejected missing edges', int(np.sum(complete & ~joined)))
+    profiler.count('rejected flat', int(np.sum(complete & joined & flat)))
+    formalBlocks = np.concatenate((quad1[kept], quad2[kept]), axis=1) # verts defining the block in correct order
+    block_centres = block_centres[kept]
+    yield 'formal blocks', len(formalBlocks)
+    checkCancel(cancel, deadline)
 # formalBlocks are blocks that hava formal block structure and are not flat. Still in an O-mesh there are more formal
 # blocks present than what we want. More filtering...
 
-    for bid, vl in enumerate(formalBlocks):
-        fs = []
-        fs.append(vl[0:4])
-        fs.append(vl[4:8])
-        fs.append([vl[0], vl[1], vl[5], vl[4]])
-        fs.append([vl[1], vl[2], vl[6], vl[5]])
-        fs.append([vl[2], vl[3], vl[7], vl[6]])
-        fs.append([vl[3], vl[0], vl[4], vl[7]])
-        blockcentre = block_centres[bid]
-        for f in fs:
-            fid, tmp = findFace(faces_as_list_of_nodes, f)
-            normal = face_info[fid]['normal']
-            facecentre = face_info[fid]['centre']
-            direction = normal.dot((blockcentre-facecentre))
-            if direction >= 0.:
-                face_info[fid]['pos'].append(bid)
+    with profiler.span('classification'):
+        block_faces = formalBlocks[:,blockFaceNodes]
+        fids = np.array([face_index[tuple(sorted(f))] for f in block_faces.reshape(-1,4).tolist()], dtype=np.int64).reshape(-1,6)
+        positive = faceSides(face_normals[fids], face_centres[fids], block_centres[:,None,:])
+        # Not more than two blocks on each side of a face. If a block scores too high in 'offences' it will be ruled out
+        offences = blockOffences(fids, positive, len(faces))
+        allowed = (offences <= 3) & ~np.all(np.isin(formalBlocks, np.asarray(disabled, dtype=np.int64)), axis=1)
+    profiler.count('rejected offences', int(np.sum(offences > 3)))
+    profiler.count('rejected disabled', int(np.sum((offences <= 3) & ~allowed)))
+    # Dont let non-allowed blocks to stop definition of patch names
+    face_owner, face_neighbour = faceBlocks(fids[allowed], positive[allowed], len(faces))
+    block_print_out = formalBlocks[allowed]
+    with profiler.span('block edges'):
+        dependent_edges = blockEdges(block_print_out)
+    profiler.count('blocks', len(block_print_out))
+    yield 'blocks', len(block_print_out)
+    checkCancel(cancel, deadline)
+    # Couple the dependent edge sets into edge groups
+    with profiler.span('edge coupling'):
+        if numba:
+            dependent_edges = cycleFinderNumba.couple_edges(dependent_edges)
+        else:
+            dependent_edges = couple_edges(dependent_edges)
+    yield 'edge groups', len(dependent_edges)
+    if logFile:
+        logFile.close()
+    yield 'done', BlockTopology.fromGroups(block_print_out, faces, face_owner, face_neighbour, dependent_edges)
+
+
+def updateBlocks(edges, vertices_coord, blocks, dirty, numba=False, search='faceLoops'):
+# Incremental blockFinder for locally edited blockings. blocks are the stored blocks (8 vertex ids each,
+# list index = block id) and dirty the vertices that were added or moved or are at the end of an added
+# or removed edge. Only the blocks through dirty vertices are detected again, in a window of the mesh
+# wide enough to hold them and the blocks sharing their faces. New blocks fill the freed ids. Block ids
+# are the indices of the object's block list and stay contiguous, so if fewer blocks are found than
+# were freed, the last blocks move into the remaining holes; only then do untouched blocks get new ids.
+# Returns a BlockTopology of all blocks and edge groups but only the faces around the re-detected
+# blocks, the ids of the new blocks and a dict {old id: new id} of the moved blocks.
+    nverts = len(vertices_coord)
+    dirty = np.unique(np.asarray(list(dirty), dtype=np.int64))
+    offsets, neighbours, edge_ids = vertexAdjacency(edges, nverts)
+    in_window = np.zeros(nverts, dtype=bool)
+    in_window[dirty] = True
+    front = dirty
+    for i in range(6): # a block spans 3 edges, a block sharing one of its faces 3 more
+        n = np.diff(offsets)[front]
+        ring = neighbours[np.repeat(offsets[front] - np.cumsum(n) + n, n) + np.arange(n.sum())]
+        front = np.unique(ring[~in_window[ring]])
+        in_window[front] = True
+
+    window = np.flatnonzero(in_window)
+    local = -np.ones(nverts, dtype=np.int64)
+    local[window] = np.arange(len(window))
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    window_edges = local[edges[np.all(in_window[edges], axis=1)]].tolist()
+    found = blockFinder(window_edges, [vertices_coord[v] for v in window], numba=numba, search=search)
+
+    is_dirty = np.zeros(nverts, dtype=bool)
+    is_dirty[dirty] = True
+    kept = dict()
+    freed = []
+    for bid, vl in enumerate(blocks):
+        if any(is_dirty[v] for v in vl):
+            freed.append(bid)
+        else:
+            kept[tuple(sorted(vl))] = bid
+
+    # Window blocks through dirty vertices are the new blocks, the others are kept blocks
+    block_print_out = [list(vl) for vl in blocks]
+    removed = list(freed)
+    window_ids = []
+    changed = []
+    for vl in found.block_verts:
+        vl = window[vl].tolist()
+        if any(is_dirty[v] for v in vl):
+            if freed:
+                bid = freed.pop(0)
+                block_print_out[bid] = vl
             else:
-                face_info[fid]['neg'].append(bid)
-    for f in face_info:  # Not more than two blocks on each side of a face. If a block scores too high in 'offences' it will be ruled out
-        if len(face_info[f]['pos'])>1:
-            for bid in face_info[f]['pos']:
-                offences[bid] += 1
-        if len(face_info[f]['neg'])>1:
-            for bid in face_info[f]['neg']:
-                offences[bid] += 1
-    block_print_out = []
-    for bid, vl in enumerate(formalBlocks):
-        if offences[bid] <= 3 and not all( v in disabled for v in vl ):
-            block_print_out.append(vl)
-            i_edges = [edge(vl[0],vl[1]), edge(vl[2],vl[3]), edge(vl[4],vl[5]), edge(vl[6],vl[7])]
-            j_edges = [edge(vl[1],vl[2]), edge(vl[3],vl[0]), edge(vl[5],vl[6]), edge(vl[7],vl[4])]
-            k_edges = [edge(vl[0],vl[4]), edge(vl[1],vl[5]), edge(vl[2],vl[6]), edge(vl[3],vl[7])]
-#            i_edges = [[vl[0],vl[1]], [vl[2],vl[3]], [vl[4],vl[5]], [vl[6],vl[7]]]
-#            j_edges = [[vl[1],vl[2]], [vl[3],vl[0]], [vl[5],vl[6]], [vl[7],vl[4]]]
-#            k_edges = [[vl[0],vl[4]], [vl[1],vl[5]], [vl[2],vl[6]], [vl[3],vl[7]]]
-            dependent_edges.append(i_edges) #these 4 edges have the same resolution
-            dependent_edges.append(j_edges) #these 4 edges have the same resolution
-            dependent_edges.append(k_edges) #these 4 edges have the same resolution
-            for e in range(4):
-                if not i_edges[e] in all_edges:
-                    all_edges.append(i_edges[e])
-                if not j_edges[e] in all_edges:
-                    all_edges.append(j_edges[e])
-                if not k_edges[e] in all_edges:
-                    all_edges.append(k_edges[e])
-        else:  # Dont let non-allowed blocks to stop definition of patch names
-            for f in face_info:
-                if bid in face_info[f]['pos']:
-                    ind = face_info[f]['pos'].index(bid)
-                    face_info[f]['pos'].pop(ind)
-                if bid in face_info[f]['neg']:
-                    ind = face_info[f]['neg'].index(bid)
-                    face_info[f]['neg'].pop(ind)
-    # stime = time.time()
-    #this is the second most time consuming step
-    still_coupling = True
-    while still_coupling:
-        still_coupling = couple_edges(dependent_edges)
-    # blockBuilder2.couple_edges(dependent_edges)
-    # print('still coupling, t',time.time() - stime)
-
-    for es, edgeSet in enumerate(dependent_edges): # remove duplicates in lists
-        dependent_edges[es] = removedup(edgeSet)
-    return logFile, block_print_out, dependent_edges, face_info, all_edges, faces_as_list_of_nodes
-
+                bid = len(block_print_out)
+                block_print_out.append(vl)
+            changed.append(bid)
+            window_ids.append(bid)
+        else:
+            window_ids.append(kept.get(tuple(sorted(vl)), -1))
+    for bid in freed:
+        block_print_out[bid] = None
+    moved = dict()
+    while None in block_print_out:
+        vl = block_print_out.pop()
+        if vl is not None:
+            hole = block_print_out.index(None)
+            block_print_out[hole] = vl
+            moved[len(block_print_out)] = hole
+    renumbered = dict(moved)
+    changed = [moved.pop(bid, bid) for bid in changed]
+
+    dependent_edges = blockEdges(np.array(block_print_out, dtype=np.int64).reshape(-1,8))
+    if numba:
+        from . import cycleFinderNumba
+        dependent_edges = cycleFinderNumba.couple_edges(dependent_edges)
+    else:
+        dependent_edges = couple_edges(dependent_edges)
+
+    # Faces of the new and the removed blocks get their sides from the window detection
+    patched = set()
+    for vl in [blocks[bid] for bid in removed] + [block_print_out[bid] for bid in changed]:
+        for f in ([vl[0],vl[1],vl[2],vl[3]], [vl[4],vl[5],vl[6],vl[7]], [vl[0],vl[1],vl[5],vl[4]],
+                  [vl[1],vl[2],vl[6],vl[5]], [vl[2],vl[3],vl[7],vl[6]], [vl[3],vl[0],vl[4],vl[7]]):
+            patched.add(tuple(sorted(f)))
+    final_id = np.array([renumbered.get(bid, bid) for bid in window_ids] + [-1], dtype=np.int64)
+    faces = window[found.face_verts]
+    keys = [tuple(f) for f in np.sort(faces, axis=1).tolist()]
+    in_patch = np.array([key in patched for key in keys], dtype=bool)
+    patched.difference_update(keys)
+    # faces of removed blocks that are not quads anymore have no blocks
+    lost = np.array(sorted(patched), dtype=np.int64).reshape(-1,4)
+    owner = np.concatenate((final_id[found.face_owner[in_patch]], -np.ones(len(lost), dtype=np.int64)))
+    neighbour = np.concatenate((final_id[found.face_neighbour[in_patch]], -np.ones(len(lost), dtype=np.int64)))
+    topology = BlockTopology.fromGroups(block_print_out, np.concatenate((faces[in_patch], lost)), owner, neighbour, dependent_edges)
+    return topology, changed, moved
+
+def components(edges, nverts):
+    # Connected components of the edge graph as lists of vertex ids, largest first. Isolated vertices are left out.
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    if not len(edges):
+        return []
+    roots = disjointSetRoots(edges, nverts)
+    used = np.zeros(nverts, dtype=bool)
+    used[edges.reshape(-1)] = True
+    verts = np.flatnonzero(used)
+    verts = verts[np.argsort(roots[verts], kind='stable')]
+    comps = np.split(verts, np.flatnonzero(np.diff(roots[verts])) + 1)
+    return sorted(comps, key=lambda c: (-len(c), c[0]))
+
+def componentBlocks(args):
+    # Runs blockFinder on one component in a worker process. Ids in and out are local to the component.
+    edges, coords, disabled, numba, search = args
+    return blockFinder(edges, coords, disabled = disabled, numba = numba, search = search)
+
+def processContext():
+    # Worker processes are started fresh instead of forked: a process forked after Numba's thread pool
+    # (or Blender) has started threads leaves the parent unable to exit.
+    import multiprocessing
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+def parallelBlockFinder(edges, vertices_coord, disabled = [], numba=False, search='faceLoops', workers=None):
+# blockFinder for blockings with several disconnected parts. Every connected component of the edge graph is
+# searched in its own process and the results are merged with the block, face and edge group ids of each
+# component offset by those of the components before it. The workers import the main module again,
+# so a script calling this needs the usual if __name__ == '__main__' guard. Inside Blender the add-on
+# sets the Python executable the workers are started with (setWorkerExecutable).
+    from concurrent.futures import ProcessPoolExecutor
+    nverts = len(vertices_coord)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    coords = [tuple(v) for v in vertices_coord]
+    comps = components(edges, nverts)
+    local = np.full(nverts, -1, dtype=np.int64)
+    comp_of = np.full(nverts, -1, dtype=np.int64)
+    jobs = []
+    for cid, c in enumerate(comps):
+        local[c] = np.arange(len(c))
+        comp_of[c] = cid
+    if len(comps) > 1:
+        # the processes already use the cores, Numba parallel in each of them would oversubscribe them
+        numba = bool(numba)
+    for cid, c in enumerate(comps):
+        e = local[edges[comp_of[edges[:,0]] == cid]]
+        jobs.append((e.tolist(), [coords[v] for v in c.tolist()], [int(local[v]) for v in disabled if comp_of[v] == cid], numba, search))
+
+    if len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=processContext()) as pool:
+            results = list(pool.map(componentBlocks, jobs))
+    else:
+        results = [componentBlocks(job) for job in jobs]
+
+    empty = lambda *shape: np.zeros(shape, dtype=np.int64)
+    block_verts, face_verts, owner, neighbour, group_offsets, group_edges = [empty(0,8)], [empty(0,4)], [empty(0)], [empty(0)], [empty(1)], [empty(0,2)]
+    nblocks = nedges = 0
+    for c, t in zip(comps, results):
+        block_verts.append(c[t.block_verts])
+        face_verts.append(c[t.face_verts])
+        owner.append(np.where(t.face_owner >= 0, t.face_owner + nblocks, -1))
+        neighbour.append(np.where(t.face_neighbour >= 0, t.face_neighbour + nblocks, -1))
+        group_offsets.append(t.group_offsets[1:] + nedges)
+        group_edges.append(c[t.group_edges])
+        nblocks += len(t.block_verts)
+        nedges += len(t.group_edges)
+    return BlockTopology(np.concatenate(block_verts), np.concatenate(face_verts), np.concatenate(owner),
+            np.concatenate(neighbour), np.concatenate(group_offsets), np.concatenate(group_edges))
+
+def blockFinderWorker(connection, cancel, edges, vertices_coord, kwargs):
+    try:
+        for phase, result in blockFinderSteps(edges, vertices_coord, cancel = cancel, **kwargs):
+            connection.send((phase, result))
+    except DetectionCancelled as e:
+        connection.send(('cancelled', str(e)))
+    except Exception as e:
+        connection.send(('error', repr(e)))
+
+class BackgroundBlockFinder:
+# Runs blockFinderSteps in a worker process started by processContext, never a fork of Blender. Inside
+# Blender the add-on sets the Python executable the worker is started with (setWorkerExecutable).
+# poll() returns the (phase, count) messages received so far without waiting; the last one
+# is ('done', results), or ('cancelled', message) / ('error', message) if the detection failed.
+    def __init__(self, edges, vertices_coord, **kwargs):
+        vertices_coord = [tuple(v) for v in vertices_coord]
+        context = processContext()
+        self.connection, sender = context.Pipe(duplex=False)
+        self.cancelEvent = context.Event()
+        self.worker = context.Process(target = blockFinderWorker, args = (sender, self.cancelEvent, edges, vertices_coord, kwargs))
+        self.worker.daemon = True
+        self.worker.start()
+        # Only the worker holds the sending end now, so the pipe is closed when it dies
+        sender.close()
+
+    def poll(self):
+        messages = []
+        try:
+            while self.connection.poll():
+                messages.append(self.connection.recv())
+                if messages[-1][0] in ('done', 'cancelled', 'error'):
+                    self.worker.join()
+                    return messages
+        except (EOFError, OSError): # killed, e.g. out of memory, without a last message
+            self.worker.join()
+            messages.append(('error', 'worker exited with code {}'.format(self.worker.exitcode)))
+        return messages
+
+    def cancel(self):
+        self.cancelEvent.set()
@@ -0,0 +1,91 @@
+import os
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+from .blockBuilder import edgeKeys, BlockTopology
+
+# Block detection results stored on disk, so reopening a file, duplicating an object
+# or undoing an edit does not run blockFinder again for a blocking already seen.
+cacheDir = os.path.join(tempfile.gettempdir(), 'swiftblock_cache')
+maxSize = 256*1024*1024
+hits = 0
+misses = 0
+
+# The block vertex order and the face sides depend on the coordinates,
+# so they are hashed together with the vertex count and the sorted edge keys.
+def topologyHash(edges, vertices_coord, disabled = []):
+    nverts = len(vertices_coord)
+    keys = edgeKeys(edges)[0]
+    coords = np.round(np.array([tuple(v) for v in vertices_coord], dtype=float).reshape(-1,3), 6) + 0.
+    h = hashlib.sha1()
+    h.update(np.int64(nverts).tobytes())
+    h.update(keys.tobytes())
+    h.update(coords.tobytes())
+    h.update(np.array(sorted(disabled), dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+def cacheFile(key):
+    return os.path.join(cacheDir, key + '.npz')
+
+def store(key, topology):
+    # Every writer gets its own temporary file, so Blender instances storing the same key do not race
+    tmp = None
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=cacheDir)
+        with os.fdopen(fd, 'wb') as f:
+            np.savez_compressed(f, **dict((a, getattr(topology, a)) for a in BlockTopology.__slots__))
+        os.replace(tmp, cacheFile(key))
+        evict()
+    except OSError as e:
+        print('Could not write the block cache: {}'.format(e))
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+
+def load(key):
+    global hits, misses
+    filename = cacheFile(key)
+    try:
+        with np.load(filename) as data:
+            topology = BlockTopology(*[data[a] for a in BlockTopology.__slots__])
+        os.utime(filename)
+    except FileNotFoundError:
+        misses += 1
+        return None
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        # cut short or written by an older version
+        misses += 1
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+        return None
+    hits += 1
+    return topology
+
+# Least recently used files are removed until the cache fits in maxSize
+def evict():
+    files = []
+    for name in os.listdir(cacheDir):
+        if name.endswith('.npz'):
+            st = os.stat(os.path.join(cacheDir, name))
+            files.append((st.st_mtime, st.st_size, name))
+    files.sort()
+    size = sum(f[1] for f in files)
+    for mtime, fsize, name in files:
+        if size <= maxSize:
+            break
+        os.remove(os.path.join(cacheDir, name))
+        size -= fsize
+
+def clear():
+    global hits, misses
+    if os.path.isdir(cacheDir):
+        for name in os.listdir(cacheDir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(cacheDir, name))
+    hits = misses = 0
+
+def report():
+    return 'block cache: {} hits, {} misses'.format(hits, misses)
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import numpy as np
+from . import blockBuilder
+from . import utils
+from . import noBlockMeshOnlyDict
+from . import profiler
+
+# Command line block detection and blockMeshDict writing without Blender:
+#   python -m swiftBlock.cli blocking.json -o case
+# The blocking is either an OBJ file (v lines and the edges of l and f lines) or a JSON file
+#   {"verts": [[x,y,z], ...], "edges": [[v0,v1], ...],
+#    "edgeMappings": [{"edge": [v0,v1], "cells": 20, "x1": 0.01, "x2": 0, "r1": 1.2, "r2": 1.2}, ...],
+#    "patches": [{"name": "inlet", "type": "patch", "faces": [[v0,v1,v2,v3], ...]}, ...]}
+# An edge mapping applies to the whole edge group of its edge, x1/r1 at v0 and x2/r2 at v1.
+
+def readObj(filename):
+    verts = []
+    edges = []
+    for line in open(filename):
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == 'v':
+            verts.append([float(x) for x in words[1:4]])
+        elif words[0] in ('l', 'f'):
+            ids = [int(w.split('/')[0]) for w in words[1:]]
+            ids = [i - 1 if i > 0 else len(verts) + i for i in ids]
+            if words[0] == 'f':
+                ids.append(ids[0])
+            edges.extend([a, b] for a, b in zip(ids[:-1], ids[1:]))
+    return {'verts': verts, 'edges': uniqueEdges(edges)}
+
+def uniqueEdges(edges):
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    first = np.sort(np.unique(blockBuilder.edgeKey(edges[:,0], edges[:,1]), return_index=True)[1])
+    return edges[first].tolist()
+
+def readBlocking(filename):
+    if filename.lower().endswith('.obj'):
+        return readObj(filename)
+    with open(filename) as f:
+        return json.load(f)
+
+def collectEdges(verts, block_verts, dependent_edges, edgeMappings, cells=10, mappingType='Geometric MG'):
+    # edgeInfo of the block edges like the add-on builds it from the edge layers: edge directions are
+    # propagated through each edge group and every group gets the mapping given for one of its edges.
+    verts = np.asarray(verts, dtype=float)
+    with profiler.span('edge directions'):
+        edgeDirections = utils.getEdgeDirections(block_verts, dependent_edges)
+    group = dict()
+    for gid, g in enumerate(dependent_edges):
+        g = np.reshape(g, (-1,2))
+        group.update(dict.fromkeys(blockBuilder.edgeKey(g[:,0], g[:,1]).tolist(), gid))
+
+    mappings = dict()
+    for m in edgeMappings:
+        v0, v1 = m['edge']
+        gid = group.get(int(blockBuilder.edgeKey(v0, v1)))
+        if gid is None:
+            print('Edge {} is not a block edge, mapping ignored'.format(m['edge']))
+            continue
+        be = {'type': m.get('type', mappingType), 'N': m.get('cells', cells),
+              'x1': m.get('x1', 0.), 'x2': m.get('x2', 0.), 'r1': m.get('r1', 1.), 'r2': m.get('r2', 1.), 'ratio': m.get('ratio', 1.)}
+        if not (v0, v1) in edgeDirections[gid]:
+            be['x1'], be['x2'] = be['x2'], be['x1']
+            be['r1'], be['r2'] = be['r2'], be['r1']
+            be['ratio'] = 1./be['ratio']
+        mappings[gid] = be
+
+    default = {'type': mappingType, 'N': cells, 'x1': 0., 'x2': 0., 'r1': 1., 'r2': 1., 'ratio': 1.}
+    directed = []
+    edges = []
+    for gid, ed in enumerate(edgeDirections):
+        for v0, v1 in ed:
+            be = dict(mappings.get(gid, default))
+            be['L'] = float(np.linalg.norm(verts[v0] - verts[v1]))
+            directed.append((v0, v1))
+            edges.append(be)
+    edgeInfo = dict()
+    for (v0, v1), (mapping, reverse) in zip(directed, utils.batchEdgeMappings(edges)):
+        edgeInfo[int(utils.directedEdgeKey(v0, v1))], edgeInfo[int(utils.directedEdgeKey(v1, v0))] = mapping, reverse
+    return edgeInfo
+
+def writeCase(blocking, folder, cells=10, mappingType='Geometric MG', search='faceLoops', numba=False):
+    verts = [tuple(v) for v in blocking['verts']]
+    edges = blocking['edges']
+    topology = blockBuilder.blockFinder(edges, verts, numba = numba, search = search)
+    block_verts, dependent_edges = topology.block_verts.tolist(), topology.groups()
+    with profiler.span('collectEdges'):
+        edgeInfo = collectEdges(verts, block_verts, dependent_edges, blocking.get('edgeMappings', []), cells, mappingType)
+    boundaries = [{'name': p['name'], 'type': p.get('type', 'patch'), 'faceVerts': p['faces']} for p in blocking.get('patches', []) if p['faces']]
+    projections = {'vert2surf':dict(),'edge2surf':dict(),'face2surf':dict(), 'geo':dict()}
+
+    mesh = noBlockMeshOnlyDict.PreviewMesh(folder)
+    mesh.blockMeshDictPath = os.path.join(folder, 'system', 'blockMeshDict')
+    with profiler.span('dict write'):
+        ncells = mesh.writeBlockMeshDict(verts, 1, boundaries, [], edgeInfo, ['']*len(block_verts), block_verts, dependent_edges, projections)
+    return len(block_verts), ncells
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Detect the blocks of a blocking and write system/blockMeshDict')
+    parser.add_argument('blocking', help='OBJ or JSON file with the vertices and edges of the blocking')
+    parser.add_argument('-o', '--case', default='.', help='OpenFOAM case directory (default: current directory)')
+    parser.add_argument('--cells', type=int, default=10, help='cells of the edge groups without an edge mapping')
+    parser.add_argument('--mapping-type', default='Geometric MG', choices=['Geometric MG', 'Geometric'])
+    parser.add_argument('--search', default='faceLoops', choices=['faceLoops', 'hexes'], help='block search method')
+    parser.add_argument('--numba', action='store_true', help='find the faces with Numba')
+    parser.add_argument('--profile', help='write the time spent in each stage to this Chrome trace json file')
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        profiler.start()
+    with profiler.span('read blocking'):
+        blocking = readBlocking(args.blocking)
+    nblocks, ncells = writeCase(blocking, args.case, args.cells, args.mapping_type, args.search, args.numba)
+    print('Wrote {} blocks and {} cells to {}'.format(nblocks, ncells, os.path.join(args.case, 'system', 'blockMeshDict')))
+    if args.profile:
+        profiler.stop()
+        profiler.writeTrace(args.profile)
+        print(profiler.report())
+
+if __name__ == '__main__':
+    main()
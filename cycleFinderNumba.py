@@ -1,90 +1,112 @@
-from numba import jit
+from numba import jit, prange
 import numpy as np
+from . import blockBuilder
+from .blockBuilder import vertexAdjacency
 
-# @jit(nopython=True)
-def still_coupling(dependent_edges):
-    for es0 in range(len(dependent_edges)):
-        edgeSet0 = dependent_edges[es0]
-        for edge in edgeSet0:
-            for es1 in range(len(dependent_edges)):
-                edgeSet1 = dependent_edges[es1]
-                if edge in edgeSet1 and es0 != es1:
-                    for e in edgeSet0:
-                        edgeSet1.append(e)
-                    dependent_edges.pop(es0)
-                    return True
-    return False
+@jit(nopython=True, cache=True)
+def find(parent, i):
+    root = i
+    while parent[root] != root:
+        root = parent[root]
+    while parent[i] != root:
+        parent[i], i = root, parent[i]
+    return root
 
-def couple_edges(dependent_edges):
-    while still_coupling(dependent_edges):
-        pass
-
-def cycleFinder(edges,verts):
-    verticesId = np.array(verts)
-    edges = np.array(edges)
-    edgeVisited = np.zeros(len(edges), dtype=bool)
-    faces = [-1] # For Numba the arrays have to contain element
-    facesEdges = [-1]
-    no_edges = 0
+@jit(nopython=True, cache=True)
+def disjointSetRoots(sets, n):
+    parent = np.arange(n)
+    for s in range(sets.shape[0]):
+        r0 = find(parent, sets[s,0])
+        for i in range(1, sets.shape[1]):
+            r = find(parent, sets[s,i])
+            if r != r0:
+                parent[r] = r0
+    for i in range(n):
+        parent[i] = find(parent, i)
+    return parent
 
-    # 50 is the limit of vertices in one edge. Should be enough, maybe too many?
-    v_in_edge = np.ones((len(verticesId),50),dtype=int) * -1
-    for v in verticesId:
-        for eid, e in enumerate(edges):
-            if v in e:
-                v_in_edge[v][np.where(v_in_edge[v] == -1)[0][0]] = eid
-
-    run(verticesId,edges,edgeVisited,faces,facesEdges,no_edges, v_in_edge)
+def couple_edges(dependent_edges):
+    return blockBuilder.couple_edges(dependent_edges, disjointSetRoots)
 
-    # Clean double faces
-    faces = np.reshape(faces[1:],(-1,4))
-    temp, u = np.unique(np.sort(faces), axis=0, return_index=True)
-    faces = faces[u]
-    facesP = [list(map(np.asscalar,f)) for f in faces]
+def cycleFinder(edges,verts,parallel=False,arrays=False):
+    # blockBuilder.quadFinder with the wedges enumerated in compiled loops, same faces in the same order
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    offsets, neighbours, edge_ids = vertexAdjacency(edges, len(verts))
+    rank = blockBuilder.degreeRanks(offsets)
+    if parallel:
+        cycles = wedgeCyclesParallel(len(verts), offsets, neighbours, edge_ids, rank)
+    else:
+        cycles = wedgeCycles(len(verts), offsets, neighbours, edge_ids, rank)
+    return blockBuilder.canonicalQuads(cycles, arrays)
 
-    facesEdges = np.reshape(facesEdges[1:],(-1,4))
-    facesEdges = facesEdges[u]
-    facesEdgesP = [list(map(np.asscalar,f)) for f in facesEdges]
+# The 4-cycles a-b-c-d with a as their highest ranked vertex, from every pair of wedges a-b-c and a-d-c
+# through lower ranked vertices. Returns the number of cycles and writes them to cycles[at:] if write is set.
+@jit(nopython=True, cache=True)
+def vertexCycles(a, offsets, neighbours, edge_ids, rank, cycles, at, write):
+    nwedges = 0
+    for i in range(offsets[a], offsets[a+1]):
+        b = neighbours[i]
+        if rank[b] < rank[a]:
+            nwedges += offsets[b+1] - offsets[b]
+    wb = np.empty(nwedges, dtype=np.int64)
+    wc = np.empty(nwedges, dtype=np.int64)
+    wab = np.empty(nwedges, dtype=np.int64)
+    wbc = np.empty(nwedges, dtype=np.int64)
+    k = 0
+    for i in range(offsets[a], offsets[a+1]):
+        b = neighbours[i]
+        if rank[b] < rank[a]:
+            for j in range(offsets[b], offsets[b+1]):
+                c = neighbours[j]
+                if rank[c] < rank[a]:
+                    wb[k], wc[k], wab[k], wbc[k] = b, c, edge_ids[i], edge_ids[j]
+                    k += 1
+    order = np.argsort(wc[:k], kind='mergesort')
+    n = 0
+    first = 0
+    while first < k:
+        last = first + 1
+        while last < k and wc[order[last]] == wc[order[first]]:
+            last += 1
+        for p in range(first, last):
+            for q in range(p+1, last):
+                if write:
+                    w1, w2 = order[p], order[q]
+                    cycles[at+n,0], cycles[at+n,1], cycles[at+n,2], cycles[at+n,3] = a, wb[w1], wc[w1], wb[w2]
+                    cycles[at+n,4], cycles[at+n,5], cycles[at+n,6], cycles[at+n,7] = wab[w1], wbc[w1], wbc[w2], wab[w2]
+                n += 1
+        first = last
+    return n
 
-    return facesP, facesEdgesP
+# The cycles of every vertex are counted first and then written to their own slice of the result
+@jit(nopython=True, cache=True)
+def wedgeCycles(nverts, offsets, neighbours, edge_ids, rank):
+    starts = np.zeros(nverts+1, dtype=np.int64)
+    empty = np.empty((0,8), dtype=np.int64)
+    for a in range(nverts):
+        starts[a+1] = starts[a] + vertexCycles(a, offsets, neighbours, edge_ids, rank, empty, 0, False)
+    cycles = np.empty((starts[-1],8), dtype=np.int64)
+    for a in range(nverts):
+        vertexCycles(a, offsets, neighbours, edge_ids, rank, cycles, starts[a], True)
+    return cycles
 
-@jit(nopython=True)
-def run(verticesId,edges,edgeVisited,faces,facesEdges,no_edges, v_in_edge):
-    for v in verticesId:
-        currentCycle = [v]
-        currentCycleEdges = [-1]
-        buildFourEdgeFaces(v, edgeVisited, edges, no_edges, currentCycle, currentCycleEdges, faces, facesEdges, v_in_edge, first=True)
+# wedgeCycles over the vertices on all cores
+@jit(nopython=True, parallel=True, cache=True)
+def wedgeCyclesParallel(nverts, offsets, neighbours, edge_ids, rank):
+    counts = np.zeros(nverts+1, dtype=np.int64)
+    empty = np.empty((0,8), dtype=np.int64)
+    for a in prange(nverts):
+        counts[a+1] = vertexCycles(a, offsets, neighbours, edge_ids, rank, empty, 0, False)
+    starts = np.cumsum(counts)
+    cycles = np.empty((starts[-1],8), dtype=np.int64)
+    for a in prange(nverts):
+        vertexCycles(a, offsets, neighbours, edge_ids, rank, cycles, starts[a], True)
+    return cycles
 
-@jit(nopython=True)
-def buildFourEdgeFaces(v, edgeVisited, edges, no_edges, currentCycle, currentCycleEdges, faces, facesEdges, v_in_edge, first=False):
-    for eid in v_in_edge[v]:
-        if eid == -1:
-            break
-        e = edges[eid]
-        if v == e[0]:
-            opposite_v = e[1]
-        elif v == e[1]:
-            opposite_v = e[0]
-        else:
-            continue
-        if not edgeVisited[eid]:
-            no_edges += 1
-            edgeVisited[eid] = True
-            currentCycle.append(opposite_v)
-            if first:
-                currentCycleEdges[0] = eid
-                first = False
-            else:
-                currentCycleEdges.append(eid)
-            if currentCycle[0] == currentCycle[-1]: # First equals last -> we have a face
-                # we are only interested in quads
-                if len(currentCycle) == 5:
-                    faces.extend(currentCycle[0:4])
-                    facesEdges.extend(currentCycleEdges[0:4])
-            else:
-                if no_edges < 4:
-                    buildFourEdgeFaces(opposite_v, edgeVisited, edges, no_edges, currentCycle, currentCycleEdges, faces, facesEdges, v_in_edge)
-            no_edges -= 1
-            currentCycle.pop()
-            currentCycleEdges.pop()
-            edgeVisited[eid] = False
+def warmUp():
+    # Compiles the serial engine, or loads it from the disk cache, on a single block. The parallel
+    # kernel is left out, so no Numba thread pool is started before it is used.
+    edges = [[0,1],[1,2],[2,3],[3,0],[4,5],[5,6],[6,7],[7,4],[0,4],[1,5],[2,6],[3,7]]
+    faces, facesEdges = cycleFinder(edges, range(8))
+    cycleFinder(blockBuilder.faceConnections(facesEdges, len(edges)), range(len(faces)))
+    couple_edges([[[0,1],[2,3]], [[0,1],[4,5]]])
@@ -6,6 +6,7 @@ import shutil
 import itertools
 import glob
 from . import utils
+from . import profiler
 
 class PreviewMesh():
     def __init__(self, folder=None):
@@ -67,8 +68,8 @@ class PreviewMesh():
 
 
         NoCells = 0
-        for bid, (vl, blockName) in enumerate(zip(blocks, blockNames)):
-            edges = [(vl[e[0]],vl[e[1]]) for e in [(0,1),(3,2),(7,6),(4,5),(0,3),(1,2),(5,6),(4,7),(0,4),(1,5),(2,6),(3,7)]]
+        gradingEdges = utils.gradingEdgeKeys(blocks)
+        for bid, (vl, blockName, edges) in enumerate(zip(blocks, blockNames, gradingEdges)):
             gradingStr = ""
             for ei in edges:
                 e = edgeInfo[ei]
@@ -206,9 +207,11 @@ class PreviewMesh():
     def runMesh(self,runBlockMesh=True,internalCells=False):
         print('running blockmesh')
         if runBlockMesh:
-            self.runBlockMesh()
-        faces, bcifaces=self.getBCFaces2(internalCells)
-        points=self.getPoints(faces)
+            with profiler.span('blockMesh run'):
+                self.runBlockMesh()
+        with profiler.span('polyMesh parse'):
+            faces, bcifaces=self.getBCFaces2(internalCells)
+            points=self.getPoints(faces)
         shutil.rmtree(self.tempdir)
         return points, bcifaces
 
@@ -0,0 +1,67 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Opt-in timing of the meshing pipeline. Code marks its stages with
+#   with profiler.span('face loops'):
+# and its counts with profiler.count('faces', n). Nothing is recorded unless enabled, and the
+# recording can be written as Chrome trace json (chrome://tracing or https://ui.perfetto.dev).
+enabled = False
+events = []
+counters = {}
+origin = time.perf_counter()
+
+def start():
+    global enabled, origin
+    reset()
+    origin = time.perf_counter()
+    enabled = True
+
+def stop():
+    global enabled
+    enabled = False
+
+def reset():
+    del events[:]
+    counters.clear()
+
+def now():
+    # microseconds since start
+    return (time.perf_counter() - origin)*1e6
+
+@contextlib.contextmanager
+def span(name, **args):
+    if not enabled:
+        yield
+        return
+    begin = now()
+    try:
+        yield
+    finally:
+        events.append({'name': name, 'ph': 'X', 'ts': begin, 'dur': now() - begin,
+                       'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+def count(name, n=1):
+    if not enabled:
+        return
+    counters[name] = counters.get(name, 0) + n
+    events.append({'name': name, 'ph': 'C', 'ts': now(), 'pid': os.getpid(), 'args': {name: counters[name]}})
+
+def chromeTrace():
+    return {'traceEvents': list(events), 'displayTimeUnit': 'ms', 'otherData': {'counters': dict(counters)}}
+
+def writeTrace(filename):
+    with open(filename, 'w') as f:
+        json.dump(chromeTrace(), f)
+
+def report():
+    # total seconds per span name, slowest first, and the counters
+    totals = {}
+    for e in events:
+        if e['ph'] == 'X':
+            totals[e['name']] = totals.get(e['name'], 0.) + e['dur']*1e-6
+    lines = ['{:<24} {:10.3f} s'.format(name, t) for name, t in sorted(totals.items(), key=lambda item: -item[1])]
+    lines += ['{:<24} {:10d}'.format(name, n) for name, n in sorted(counters.items())]
+    return '\n'.join(lines)
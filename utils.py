@@ -1,12 +1,92 @@
-import bpy
+import collections
 import numpy as np
+from .blockBuilder import edgeKey, directedEdgeKey
+from . import profiler
+
+# Multi gradings already solved, keyed by the quantized mapping parameters. The reverse of an edge
+# is stored with it, as its grading is the same with the two ends swapped.
+gradingCache = collections.OrderedDict()
+gradingCacheSize = 100000
+gradingFields = ("l1", "l2", "n1", "n2", "ratio1", "ratio2", "dL", "nL")
+hits = 0
+misses = 0
+
+def gradingKey(edge):
+    return (edge["type"], round(edge["x1"], 9), round(edge["x2"], 9), round(edge["r1"], 9), round(edge["r2"], 9), int(edge["N"]), round(edge["L"], 9))
+
+def reverseKey(key):
+    t, x1, x2, r1, r2, N, L = key
+    return (t, x2, x1, r2, r1, N, L)
+
+def reverseGrading(grading):
+    l1, l2, n1, n2, ratio1, ratio2, dL, nL = grading
+    return (l2, l1, n2, n1, ratio2, ratio1, dL, nL)
+
+def cachedGrading(key):
+    grading = gradingCache.get(key)
+    if grading is not None:
+        gradingCache.move_to_end(key)
+    return grading
+
+def storeGrading(key, grading):
+    gradingCache[reverseKey(key)] = reverseGrading(grading)
+    gradingCache[key] = grading
+    while len(gradingCache) > gradingCacheSize:
+        gradingCache.popitem(last=False)
+
+def clearGradingCache():
+    global hits, misses
+    gradingCache.clear()
+    hits = misses = 0
+
+def gradingCacheReport():
+    return 'grading cache: {} hits, {} misses'.format(hits, misses)
+
+def gradings(edges):
+    # The multi gradings of the edges as tuples of gradingFields, from the cache or
+    # solved in one multiGradings call for each distinct set of parameters. Every distinct
+    # key solved is a miss, every other edge a hit.
+    global hits, misses
+    keys = [gradingKey(e) for e in edges]
+    found = [cachedGrading(k) for k in keys]
+    missing = collections.OrderedDict()
+    for k, g, e in zip(keys, found, edges):
+        if g is None:
+            missing.setdefault(k, e)
+    hits += len(keys) - len(missing)
+    misses += len(missing)
+    profiler.count('grading cache hits', len(keys) - len(missing))
+    profiler.count('grading cache misses', len(missing))
+    if not missing:
+        return found
+    columns = dict((k, [e[k] for e in missing.values()]) for k in ("x1", "x2", "r1", "r2", "N", "L"))
+    solved = multiGradings(**columns)
+    solved = dict(zip(missing, zip(*[solved[f].tolist() for f in gradingFields])))
+    for key, grading in solved.items():
+        storeGrading(key, grading)
+    return [g if g is not None else solved[k] for k, g in zip(keys, found)]
+
+def reverseEdge(edge):
+    reverse = dict(edge)
+    reverse["x1"],reverse["x2"] = reverse["x2"],reverse["x1"]
+    reverse["r1"],reverse["r2"] = reverse["r2"],reverse["r1"]
+    reverse["ratio"] = 1./reverse["ratio"]
+    return reverse
 
 def edgeMapping(edge):
     if edge["type"] == "Geometric MG":
-        return multiGrading(edge)
-    elif edge["type"] == "Geometric":
-        edge["ratio"] == edge["ratio"]
+        edge.update(zip(gradingFields, gradings([edge])[0]))
         return edge
+    elif edge["type"] == "Geometric":
+        return simpleGrading(edge)
+
+def simpleGrading(edge):
+    # A Geometric edge for the multi grading writers: one section of all N cells with the expansion ratio
+    edge["l1"], edge["l2"] = edge["L"], 0
+    edge["n1"], edge["n2"] = edge["N"], 0
+    edge["ratio1"], edge["ratio2"] = edge["ratio"], 1
+    edge["dL"], edge["nL"] = 0, 0
+    return edge
 
 def multiGrading(edge):
     eps = 1e-6
@@ -151,6 +231,106 @@ def multiGrading(edge):
     edge['dL'], edge['nL'] = dL, nL
     return edge
 
+def multiGradings(x1, x2, r1, r2, N, L):
+    # multiGrading for arrays of edges: the four grading cases are selected with masks and the
+    # secant iteration runs on all edges at once, each edge stopping when it has converged.
+    # Returns a dict of l1, l2, n1, n2, ratio1, ratio2, dL and nL arrays.
+    eps = 1e-6
+    x1, x2, r1, r2, N, L = [np.array(a, dtype=float).reshape(-1) for a in np.broadcast_arrays(x1, x2, r1, r2, N, L)]
+    n = len(x1)
+    grading1 = ~((np.abs(x1) < eps) | ((np.abs(r1) - 1) < eps))
+    grading2 = ~((np.abs(x2) < eps) | ((np.abs(r2) - 1) < eps))
+    only1 = grading1 & ~grading2
+    only2 = ~grading1 & grading2
+    both = grading1 & grading2
+
+    l1, l2, n1, n2 = np.zeros(n), np.zeros(n), np.zeros(n), np.zeros(n)
+    ratio1, ratio2 = np.ones(n), np.ones(n)
+    dL, nL = np.ones(n), N.copy()
+    with np.errstate(all='ignore'):
+        # one sided grading, x and r of the graded end
+        x = np.where(only1, x1, x2)
+        r = np.where(only1, r1, r2)
+        lfull = x*(1-r**N)/(1-r)
+        closed1 = (only1 | only2) & (lfull < L)
+        nc = np.log(1-lfull/x*(1-r))/np.log(r) + 1
+        ratioc = x*r**nc/x
+        sel = closed1 & only1
+        l1[sel], n1[sel], ratio1[sel] = L[sel], nc[sel], ratioc[sel]
+        sel = closed1 & only2
+        l2[sel], n2[sel], ratio2[sel] = L[sel], nc[sel], ratioc[sel]
+
+        # both ends graded
+        nb1 = np.trunc((np.log(x2/x1)+N*np.log(r2))/np.log(r1*r2) + 0.5)
+        nb2 = N-nb1-1
+        closed2 = both & (x1*((1-r1**nb1)/(1-r1)) + x2*((1-r2**nb2)/(1-r2)) < L)
+        m1 = np.log((L*(1-r1)*(1-r2)-x1-x2+x1*r2+x2*r1)/(-2*x1+x1*r1+x1*r2))/np.log(r1)
+        m2 = np.log(x1/x2*r1**m1)/np.log(r2)
+        dxc = x1*r1**m1
+        sel = closed2
+        l1[sel] = (x1*((1-r1**m1)/(1-r1)))[sel]
+        l2[sel] = (x2*((1-r2**m2)/(1-r2)))[sel]
+        n1[sel], n2[sel] = m1[sel]+1, m2[sel]+1
+        ratio1[sel], ratio2[sel] = (dxc/x1)[sel], (dxc/x2)[sel]
+        closed = closed1 | closed2
+        dL[closed], nL[closed] = 0, 0
+
+        # secant iteration on the cell size dx of the ungraded middle part
+        iterate = (grading1 | grading2) & ~closed
+        def approx(dx, i):
+            nx = np.log(dx/x[i])/np.log(r[i]) + 1
+            lx = x[i]*(1-r[i]**nx)/(1-r[i])
+            nn1 = np.log(dx/x1[i])/np.log(r1[i]) + 1
+            nn2 = np.log(dx/x2[i])/np.log(r2[i]) + 1
+            ll1 = x1[i]*(1-r1[i]**nn1)/(1-r1[i])
+            ll2 = x2[i]*(1-r2[i]**nn2)/(1-r2[i])
+            err = np.where(both[i], L[i] - (ll1 + ll2 + (N[i] - nn1 - nn2-1)*dx), L[i] - (lx + (N[i] - nx)*dx))
+            return err, np.array((nx, lx, nn1, nn2, ll1, ll2))
+        dx_old = L/N
+        err_old = approx(dx_old, slice(None))[0]
+        dx = dx_old*1.2*1e-10
+        err, out = approx(dx, slice(None))
+        # only the edges not converged yet are evaluated again
+        i = np.flatnonzero(iterate & (np.abs(err) > 1e-12))
+        count = 0
+        while len(i) and count < 1000:
+            derr = (err[i] - err_old[i])/(dx[i] - dx_old[i])
+            dx_old[i], err_old[i] = dx[i], err[i]
+            dx[i] = dx[i] - err[i]/derr
+            err[i], out[:,i] = approx(dx[i], i)
+            i = i[np.abs(err[i]) > 1e-12]
+            count += 1
+        nx, lx, nn1, nn2, ll1, ll2 = out
+
+        sel = iterate & only1
+        n1[sel], l1[sel], ratio1[sel] = nx[sel], lx[sel], (dx/x1)[sel]
+        sel = iterate & only2
+        n2[sel], l2[sel], ratio2[sel] = nx[sel], lx[sel], (dx/x2)[sel]
+        sel = iterate & both
+        n1[sel], n2[sel], l1[sel], l2[sel] = nn1[sel], nn2[sel], ll1[sel], ll2[sel]
+        ratio1[sel], ratio2[sel] = (dx/x1)[sel], (dx/x2)[sel]
+
+        failed = iterate & (((dx < x1) & (np.abs(x1) > eps)) | ((dx < x2) & (np.abs(x2) > eps)))
+        l1[failed], l2[failed], n1[failed], n2[failed] = 0, 0, 0, 0
+        ratio1[failed], ratio2[failed] = 1, 1
+        dL[iterate], nL[iterate] = (L-l1-l2)[iterate], (N-n1-n2)[iterate]
+    return {'l1': l1, 'l2': l2, 'n1': n1, 'n2': n2, 'ratio1': ratio1, 'ratio2': ratio2, 'dL': dL, 'nL': nL}
+
+def batchEdgeMappings(edges):
+    # The mapping of every edge and the mapping of the same edge walked the other way. The reverse
+    # gradings are not solved again but swapped.
+    forward = [dict(e) for e in edges]
+    reverse = [reverseEdge(e) for e in forward]
+    graded = [i for i, e in enumerate(forward) if e["type"] == "Geometric MG"]
+    for i, grading in zip(graded, gradings([forward[i] for i in graded])):
+        forward[i].update(zip(gradingFields, grading))
+        reverse[i].update(zip(gradingFields, reverseGrading(grading)))
+    for f, r in zip(forward, reverse):
+        if f["type"] == "Geometric":
+            simpleGrading(f)
+            simpleGrading(r)
+    return list(zip(forward, reverse))
+
 def getNodes(x1,x2,r1,r2,L,dx):
     n1 = np.log(dx/x1)/np.log(r1) + 1
     n2 = np.log(dx/x1)/np.log(r1) + 1
@@ -171,78 +351,96 @@ def getNodes(x1,x2,r1,r2,L,dx):
 def edge(e0, e1):
     return [min(e0,e1), max(e0,e1)]
 
-def findFace(faces, vl):
-    for fid, f in enumerate(faces):
-        if vl[0] in f and vl[1] in f and vl[2] in f and vl[3] in f:
-            return fid, f
-    return -1, []
+# The 12 edges of a block in edgeGrading order
+gradingEdges = np.array([(0,1),(3,2),(7,6),(4,5),(0,3),(1,2),(5,6),(4,7),(0,4),(1,5),(2,6),(3,7)])
 
+def gradingEdgeKeys(blocks):
+    # Directed keys of the edges of each block in edgeGrading order, for the edgeInfo lookups of the writers
+    blocks = np.asarray(blocks, dtype=np.int64).reshape(-1,8)
+    return directedEdgeKey(blocks[:,gradingEdges[:,0]], blocks[:,gradingEdges[:,1]]).tolist()
 
 # No comments. Just works.
 def getEdgeDirections(block_print_out, dependent_edges):
-    edgeDirections = [set() for i in dependent_edges]
-    positiveBlockEdges = [[(0,1),(3,2),(7,6),(4,5)],[(0,3),(1,2),(5,6),(4,7)],[(0,4),(1,5),(2,6),(3,7)]]
-    for i in range(1000):
-        ready = True
-        for ed, de in zip(edgeDirections,dependent_edges):
-            if not len(ed)==len(de):
-                ready = False
-        if ready:
-            break
-        for bid, vl in enumerate(block_print_out):
-            for es, edgeSet in enumerate(dependent_edges):
-                for direction in range(3):
-                    if edge(vl[positiveBlockEdges[direction][0][0]],vl[positiveBlockEdges[direction][0][1]]) in edgeSet:
-                        if not edgeDirections[es]:
-                            edgeDirections[es] = set([(vl[e[0]],vl[e[1]]) for e in positiveBlockEdges[direction]])
-                        else:
-                            simedges = edgeDirections[es].intersection([(vl[e[0]],vl[e[1]]) for e in positiveBlockEdges[direction]])
-                            if simedges:
-                                edgeDirections[es] |= set([(vl[e[0]],vl[e[1]]) for e in positiveBlockEdges[direction]])
-                            else:
-                                asimedges= set(edgeDirections[es]).intersection([(vl[e[1]],vl[e[0]]) for e in positiveBlockEdges[direction]])
-                                if asimedges:
-                                    edgeDirections[es] |= set([(vl[e[1]],vl[e[0]]) for e in positiveBlockEdges[direction]])
+    # Orients the edges of every edge group the same way. The four parallel edges of a block in one
+    # direction are a node, the first node of a group is taken positive and its orientation is
+    # passed once to the nodes sharing an edge with it in a breadth first search.
+    positiveBlockEdges = np.array([[(0,1),(3,2),(7,6),(4,5)],[(0,3),(1,2),(5,6),(4,7)],[(0,4),(1,5),(2,6),(3,7)]])
+    blocks = np.asarray(block_print_out, dtype=np.int64).reshape(-1,8)
+    nodeEdges = blocks[:,positiveBlockEdges].reshape(-1,4,2)
+    nodeKeys = edgeKey(nodeEdges[:,:,0], nodeEdges[:,:,1]).tolist()
+    nodeEdges = [[tuple(e) for e in ne] for ne in nodeEdges.tolist()]
+    group = dict()
+    for gid, de in enumerate(dependent_edges):
+        de = np.reshape(de, (-1,2))
+        group.update(dict.fromkeys(edgeKey(de[:,0], de[:,1]).tolist(), gid))
+    sharing = dict()
+    for node, keys in enumerate(nodeKeys):
+        for k in keys:
+            sharing.setdefault(k, []).append(node)
 
+    edgeDirections = [set() for i in dependent_edges]
+    flipped = [None]*len(nodeKeys)
+    conflicts = set()
+    for seed in range(len(nodeKeys)):
+        gid = group.get(nodeKeys[seed][0])
+        if flipped[seed] is not None or gid is None:
+            continue
+        flipped[seed] = False
+        queue = collections.deque([seed])
+        while queue:
+            node = queue.popleft()
+            edges = [(v,u) if flipped[node] else (u,v) for u, v in nodeEdges[node]]
+            edgeDirections[gid].update(edges)
+            for k, e in zip(nodeKeys[node], edges):
+                for other in sharing[k]:
+                    flip = nodeEdges[other][nodeKeys[other].index(k)] != e
+                    if flipped[other] is None:
+                        flipped[other] = flip
+                        queue.append(other)
+                    elif flipped[other] != flip:
+                        conflicts.add(gid)
+    if conflicts:
+        print('Edge groups {} can not be oriented consistently'.format(sorted(conflicts)))
     return edgeDirections
 
+def chainEdges(edges, start=None):
+    # Vertex ids of a polyline in order, walking its edges from start. By default the walk starts at
+    # an end of the polyline, or at the first vertex of a loop, and at every vertex it takes the first
+    # edge not walked yet, so a loop ends with its first vertex again.
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1,2)
+    if start is None:
+        if not len(edges):
+            return np.zeros(0, dtype=np.int64)
+        ends = np.flatnonzero(np.bincount(edges.ravel()) == 1)
+        start = ends[0] if len(ends) else edges[0,0]
+    edges = edges.tolist()
+    adjacent = dict()
+    for eid, (a, b) in enumerate(edges):
+        adjacent.setdefault(a, []).append(eid)
+        adjacent.setdefault(b, []).append(eid)
+    walked = [False]*len(edges)
+    first = dict.fromkeys(adjacent, 0)
+    vert = int(start)
+    order = [vert]
+    while vert in adjacent:
+        eids = adjacent[vert]
+        i = first[vert]
+        while i < len(eids) and walked[eids[i]]:
+            i += 1
+        first[vert] = i
+        if i == len(eids):
+            break
+        walked[eids[i]] = True
+        a, b = edges[eids[i]]
+        vert = b if a == vert else a
+        order.append(vert)
+    return np.array(order, dtype=np.int64)
+
 def sortEdges(edges):
-    sorted=[]
-    # Find out if the edges form a loop
-    edges1D=np.ravel(edges)
-    occ=np.bincount(edges1D)
-    # This is a loop, let's just start sorting anywhere (from first element here)
-    if len(np.where(occ==1)[0])==0:
-        sorted.append(edges[0][0])
-    # This is not a loop, let's find the first or last element
-    else:
-        # Find a vertex which occurs only 1 and then it's place in 2D list
-        firstidx1D=np.where(edges1D==np.where(occ==1)[0][0])[0][0]
-        if firstidx1D % 2 == 0:
-            sorted.append(edges[int(firstidx1D/2)][0])
-        else:
-            sorted.append(edges[int((firstidx1D-1)/2)][1])
-    edgesTemp = []
-    vertids = []
-    for e in edges:
-        vertids.append(e[0])
-        vertids.append(e[1])
-    vertids = list(set(vertids))
-    vertid=sorted[0]
-    edgesTemp=edges[:]
-    for i in range(len(vertids)):
-        for eid, e in enumerate(edgesTemp):
-            if vertid in e:
-                if e[0] == vertid:
-                    sorted.append(e[1])
-                else:
-                    sorted.append(e[0])
-                edgesTemp.pop(eid)
-                vertid = sorted[-1]
-                break
-    return sorted
+    return chainEdges(edges).tolist()
 
 def obFromStructuredMesh(verts, dim, objName):
+    import bpy
     context = bpy.context
     nx, ny, nz = dim
     edges = []